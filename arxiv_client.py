@@ -0,0 +1,21 @@
+"""The arXiv client shared by the research tools."""
+
+import threading
+from typing import List
+
+import arxiv
+
+# One client (arxiv's defaults: 100 results per page, 3 s between requests,
+# 3 retries) so searches share its HTTP session and its rate limiting
+# applies across every tool instead of per search
+ARXIV_CLIENT = arxiv.Client()
+
+# The client's delay between requests is not thread-safe, so searches from
+# worker threads take turns through fetch_results
+_FETCH_LOCK = threading.Lock()
+
+
+def fetch_results(search: arxiv.Search) -> List[arxiv.Result]:
+    """Run an arXiv search to completion on the shared client, one search at a time."""
+    with _FETCH_LOCK:
+        return list(ARXIV_CLIENT.results(search))
@@ -3,7 +3,11 @@ import json
 import os
 from typing import List
 from dotenv import load_dotenv
+import httpx
 import openai
+import orjson
+from arxiv_client import fetch_results
+from papers_store import read_papers_info, write_papers_info, format_paper_info, find_paper, topic_slug
 
 
 PAPER_DIR = "papers"
@@ -20,9 +24,6 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         List of paper IDs found in the search
     """
     
-    # Use arxiv to find the papers 
-    client = arxiv.Client()
-
     # Search for the most relevant articles matching the queried topic
     search = arxiv.Search(
         query = topic,
@@ -30,18 +31,18 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         sort_by = arxiv.SortCriterion.Relevance
     )
 
-    papers = client.results(search)
+    # Use arxiv to find the papers
+    papers = fetch_results(search)
     
     # Create directory for this topic
-    path = os.path.join(PAPER_DIR, topic.lower().replace(" ", "_"))
+    path = os.path.join(PAPER_DIR, topic_slug(topic))
     os.makedirs(path, exist_ok=True)
     
     file_path = os.path.join(path, "papers_info.json")
 
     # Try to load existing papers info
     try:
-        with open(file_path, "r") as json_file:
-            papers_info = json.load(json_file)
+        papers_info = dict(read_papers_info(file_path))  # copy: the parsed dict is shared
     except (FileNotFoundError, json.JSONDecodeError):
         papers_info = {}
 
@@ -59,8 +60,7 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         papers_info[paper.get_short_id()] = paper_info
     
     # Save updated papers_info to json file
-    with open(file_path, "w") as json_file:
-        json.dump(papers_info, json_file, indent=2)
+    write_papers_info(file_path, papers_info)
     
     print(f"Results are saved in: {file_path}")
     
@@ -79,19 +79,9 @@ def extract_info(paper_id: str) -> str:
         JSON string with paper information if found, error message if not found
     """
  
-    for item in os.listdir(PAPER_DIR):
-        item_path = os.path.join(PAPER_DIR, item)
-        if os.path.isdir(item_path):
-            file_path = os.path.join(item_path, "papers_info.json")
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r") as json_file:
-                        papers_info = json.load(json_file)
-                        if paper_id in papers_info:
-                            return json.dumps(papers_info[paper_id], indent=2)
-                except (FileNotFoundError, json.JSONDecodeError) as e:
-                    print(f"Error reading {file_path}: {str(e)}")
-                    continue
+    found = find_paper(PAPER_DIR, paper_id)
+    if found is not None:
+        return format_paper_info(found[1])
     
     return f"There's no saved information related to paper {paper_id}."
 
@@ -157,7 +147,7 @@ def execute_tool(tool_name, tool_args):
         
     elif isinstance(result, dict):
         # Convert dictionaries to formatted JSON strings
-        result = json.dumps(result, indent=2)
+        result = orjson.dumps(result, option=orjson.OPT_INDENT_2).decode()
     
     else:
         # For any other type, convert using str()
@@ -165,58 +155,85 @@ def execute_tool(tool_name, tool_args):
     return result
 
 load_dotenv() 
-client = openai.OpenAI()
-
-def process_query(query):
-    
-    messages = [{'role': 'user', 'content': query}]
+# Keep-alive HTTP/2 pool so every round trip of the tool loop reuses one connection
+_HTTPX = httpx.Client(
+    http2=True,
+    timeout=60.0,
+    limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=30.0)
+)
+client = openai.OpenAI(http_client=_HTTPX)
+
+def stream_completion(messages):
+    """
+    Stream one reply, printing its text as it arrives and running each tool
+    call as soon as it has streamed completely.
     
-    response = client.chat.completions.create(
+    Returns the assistant text, the tool calls in OpenAI message format and
+    their tool messages.
+    """
+    stream = client.chat.completions.create(
         model="gpt-4o-mini",
         messages=messages,
         tools=tools,
-        max_tokens=2024
+        max_tokens=2024,
+        stream=True
     )
     
-    process_query = True
-    while process_query:
-        assistant_message = response.choices[0].message
-        assistant_content = assistant_message.content
-        
-        if assistant_content:
-            print(assistant_content)
-            messages.append({'role': 'assistant', 'content': assistant_content})
-            
-            if not assistant_message.tool_calls:
-                process_query = False
-                continue
+    content_parts = []
+    tool_calls = []
+    tool_messages = []
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            print(delta.content, end="", flush=True)
+            content_parts.append(delta.content)
+        for delta_call in delta.tool_calls or ():
+            if delta_call.index == len(tool_calls):
+                if tool_calls:
+                    # A new index means the previous call has streamed completely
+                    tool_messages.append(run_tool_call(tool_calls[-1]))
+                elif content_parts:
+                    print()
+                tool_calls.append({'id': '', 'type': 'function', 'function': {'name': '', 'arguments': ''}})
+            tool_call = tool_calls[delta_call.index]
+            if delta_call.id:
+                tool_call['id'] = delta_call.id
+            if delta_call.function:
+                tool_call['function']['name'] += delta_call.function.name or ''
+                tool_call['function']['arguments'] += delta_call.function.arguments or ''
+    if tool_calls:
+        tool_messages.append(run_tool_call(tool_calls[-1]))
+    elif content_parts:
+        print()
+    
+    return ''.join(content_parts) or None, tool_calls, tool_messages
+
+def run_tool_call(tool_call):
+    tool_id = tool_call['id']
+    tool_args = orjson.loads(tool_call['function']['arguments'] or '{}')
+    tool_name = tool_call['function']['name']
+    print(f"Calling tool {tool_name} with args {tool_args}")
+    
+    result = execute_tool(tool_name, tool_args)
+    return {
+        "role": "tool",
+        "tool_call_id": tool_id,
+        "content": result
+    }
+
+def process_query(query):
+    
+    messages = [{'role': 'user', 'content': query}]
+    
+    while True:
+        assistant_content, tool_calls, tool_messages = stream_completion(messages)
+        if not tool_calls:
+            break
         
-        if assistant_message.tool_calls:
-            messages.append({'role': 'assistant', 'content': assistant_content, 'tool_calls': assistant_message.tool_calls})
-            
-            for tool_call in assistant_message.tool_calls:
-                tool_id = tool_call.id
-                tool_args = json.loads(tool_call.function.arguments)
-                tool_name = tool_call.function.name
-                print(f"Calling tool {tool_name} with args {tool_args}")
-                
-                result = execute_tool(tool_name, tool_args)
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tool_id,
-                    "content": result
-                })
-            
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                tools=tools,
-                max_tokens=2024
-            )
-            
-            if not response.choices[0].message.tool_calls:
-                print(response.choices[0].message.content)
-                process_query = False
+        messages.append({'role': 'assistant', 'content': assistant_content, 'tool_calls': tool_calls})
+        messages.extend(tool_messages)
 
 def chat_loop():
     print("Type your queries or 'quit' to exit.")
@@ -1,34 +1,46 @@
 import arxiv
+import asyncio
+import httpx
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from mcp.server.fastmcp import FastMCP
 from dotenv import load_dotenv
 import openai
+import orjson
+from arxiv_client import fetch_results
+from papers_store import (
+    read_papers_info, write_papers_info, format_paper_info, find_paper,
+    iter_papers, count_papers, topic_dirs, topic_names, topic_slug
+)
 
 load_dotenv()
 
 PAPER_DIR = "papers"
 
+# Shared HTTP/2 connection pool for the chatbot's OpenAI calls, so the
+# multi-turn tool loop reuses one TLS connection instead of reconnecting
+_HTTPX = httpx.Client(
+    http2=True,
+    timeout=60.0,
+    limits=httpx.Limits(max_keepalive_connections=10, keepalive_expiry=30.0)
+)
+
+# Runs the chatbot's tool calls from one reply side by side
+_TOOL_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tool")
+
+# Searches can now run concurrently; this keeps two of them from losing each
+# other's updates to the same papers_info.json
+_PAPERS_LOCK = threading.Lock()
+
 # Initialize FastMCP server
 mcp = FastMCP("research")
 
-@mcp.tool()
-def search_papers(topic: str, max_results: int = 5) -> List[str]:
-    """
-    Search for papers on arXiv based on a topic and store their information.
+def _search_papers(topic: str, max_results: int = 5) -> List[str]:
+    """Blocking implementation of search_papers, also used by the local chatbot."""
     
-    Args:
-        topic: The topic to search for
-        max_results: Maximum number of results to retrieve (default: 5)
-        
-    Returns:
-        List of paper IDs found in the search
-    """
-    
-    # Use arxiv to find the papers 
-    client = arxiv.Client()
-
     # Search for the most relevant articles matching the queried topic
     search = arxiv.Search(
         query = topic,
@@ -36,42 +48,59 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         sort_by = arxiv.SortCriterion.Relevance
     )
 
-    papers = client.results(search)
+    # Use arxiv to find the papers; this is done before taking the papers
+    # lock so a slow search never holds up another topic's file update
+    papers = fetch_results(search)
     
     # Create directory for this topic
-    path = os.path.join(PAPER_DIR, topic.lower().replace(" ", "_"))
+    path = os.path.join(PAPER_DIR, topic_slug(topic))
     os.makedirs(path, exist_ok=True)
     
     file_path = os.path.join(path, "papers_info.json")
 
-    # Try to load existing papers info
-    try:
-        with open(file_path, "r") as json_file:
-            papers_info = json.load(json_file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        papers_info = {}
+    with _PAPERS_LOCK:
+        # Try to load existing papers info
+        try:
+            papers_info = dict(read_papers_info(file_path))  # copy: the parsed dict is shared
+        except (FileNotFoundError, json.JSONDecodeError):
+            papers_info = {}
 
-    # Process each paper and add to papers_info  
-    paper_ids = []
-    for paper in papers:
-        paper_ids.append(paper.get_short_id())
-        paper_info = {
-            'title': paper.title,
-            'authors': [author.name for author in paper.authors],
-            'summary': paper.summary,
-            'pdf_url': paper.pdf_url,
-            'published': str(paper.published.date())
-        }
-        papers_info[paper.get_short_id()] = paper_info
-    
-    # Save updated papers_info to json file
-    with open(file_path, "w") as json_file:
-        json.dump(papers_info, json_file, indent=2)
+        # Process each paper and add to papers_info  
+        paper_ids = []
+        for paper in papers:
+            paper_ids.append(paper.get_short_id())
+            paper_info = {
+                'title': paper.title,
+                'authors': [author.name for author in paper.authors],
+                'summary': paper.summary,
+                'pdf_url': paper.pdf_url,
+                'published': str(paper.published.date())
+            }
+            papers_info[paper.get_short_id()] = paper_info
+        
+        # Save updated papers_info to json file
+        write_papers_info(file_path, papers_info)
     
     print(f"Results are saved in: {file_path}")
     
     return paper_ids
 
+@mcp.tool()
+async def search_papers(topic: str, max_results: int = 5) -> List[str]:
+    """
+    Search for papers on arXiv based on a topic and store their information.
+    
+    Args:
+        topic: The topic to search for
+        max_results: Maximum number of results to retrieve (default: 5)
+        
+    Returns:
+        List of paper IDs found in the search
+    """
+    # The arxiv client blocks on HTTP; run it in a worker thread so the server
+    # keeps handling other requests, including concurrent searches
+    return await asyncio.to_thread(_search_papers, topic, max_results)
+
 @mcp.tool()
 def extract_info(paper_id: str) -> str:
     """
@@ -84,19 +113,9 @@ def extract_info(paper_id: str) -> str:
         JSON string with paper information if found, error message if not found
     """
  
-    for item in os.listdir(PAPER_DIR):
-        item_path = os.path.join(PAPER_DIR, item)
-        if os.path.isdir(item_path):
-            file_path = os.path.join(item_path, "papers_info.json")
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r") as json_file:
-                        papers_info = json.load(json_file)
-                        if paper_id in papers_info:
-                            return json.dumps(papers_info[paper_id], indent=2)
-                except (FileNotFoundError, json.JSONDecodeError) as e:
-                    print(f"Error reading {file_path}: {str(e)}")
-                    continue
+    found = find_paper(PAPER_DIR, paper_id)
+    if found is not None:
+        return format_paper_info(found[1])
     
     return f"There's no saved information related to paper {paper_id}."
 
@@ -108,16 +127,10 @@ def list_topics() -> List[str]:
     Returns:
         List of topic names
     """
-    if not os.path.exists(PAPER_DIR):
+    try:
+        return list(topic_names(PAPER_DIR).values())
+    except FileNotFoundError:
         return []
-        
-    topics = []
-    for item in os.listdir(PAPER_DIR):
-        item_path = os.path.join(PAPER_DIR, item)
-        if os.path.isdir(item_path):
-            topics.append(item.replace("_", " "))
-    
-    return topics
 
 @mcp.tool()
 def get_paper_count(topic: str = None) -> dict:
@@ -130,40 +143,40 @@ def get_paper_count(topic: str = None) -> dict:
     Returns:
         Dictionary with topic names and paper counts
     """
-    if not os.path.exists(PAPER_DIR):
-        return {"error": "Papers directory does not exist"}
-        
+    # Directories are only checked on a miss, so the common path needs no
+    # extra stats
+    missing = {"error": "Papers directory does not exist"}
     counts = {}
     
     if topic:
         # Count papers for specific topic
-        topic_dir = topic.lower().replace(" ", "_")
+        topic_dir = topic_slug(topic)
         topic_path = os.path.join(PAPER_DIR, topic_dir)
+        file_path = os.path.join(topic_path, "papers_info.json")
         
-        if os.path.exists(topic_path):
-            file_path = os.path.join(topic_path, "papers_info.json")
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r") as json_file:
-                        papers_info = json.load(json_file)
-                        counts[topic] = len(papers_info)
-                except (FileNotFoundError, json.JSONDecodeError):
-                    counts[topic] = 0
-        else:
+        try:
+            counts[topic] = count_papers(file_path)
+        except FileNotFoundError:
+            if not os.path.exists(topic_path):
+                if not os.path.exists(PAPER_DIR):
+                    return missing
+                counts[topic] = 0
+        except json.JSONDecodeError:
             counts[topic] = 0
     else:
         # Count papers for all topics
-        for item in os.listdir(PAPER_DIR):
-            item_path = os.path.join(PAPER_DIR, item)
-            if os.path.isdir(item_path):
-                file_path = os.path.join(item_path, "papers_info.json")
-                if os.path.isfile(file_path):
-                    try:
-                        with open(file_path, "r") as json_file:
-                            papers_info = json.load(json_file)
-                            counts[item.replace("_", " ")] = len(papers_info)
-                    except (FileNotFoundError, json.JSONDecodeError):
-                        counts[item.replace("_", " ")] = 0
+        try:
+            titles = topic_names(PAPER_DIR)
+        except FileNotFoundError:
+            return missing
+        for name, title in titles.items():
+            file_path = os.path.join(PAPER_DIR, name, "papers_info.json")
+            try:
+                counts[title] = count_papers(file_path)
+            except FileNotFoundError:
+                continue
+            except json.JSONDecodeError:
+                counts[title] = 0
     
     return counts
 
@@ -177,24 +190,28 @@ def get_available_folders() -> str:
     folders = []
     
     # Get all topic directories
-    if os.path.exists(PAPER_DIR):
-        for topic_dir in os.listdir(PAPER_DIR):
-            topic_path = os.path.join(PAPER_DIR, topic_dir)
-            if os.path.isdir(topic_path):
-                papers_file = os.path.join(topic_path, "papers_info.json")
-                if os.path.exists(papers_file):
-                    folders.append(topic_dir)
+    try:
+        names = topic_dirs(PAPER_DIR)
+    except FileNotFoundError:
+        names = ()
+    for name in names:
+        papers_file = os.path.join(PAPER_DIR, name, "papers_info.json")
+        # One stat both checks for the file and skips empty ones
+        try:
+            if os.stat(papers_file).st_size > 0:
+                folders.append(name)
+        except FileNotFoundError:
+            continue
     
     # Create a simple markdown list
-    content = "# Available Topics\n\n"
+    parts = ["# Available Topics\n\n"]
     if folders:
-        for folder in folders:
-            content += f"- {folder}\n"
-        content += f"\nUse @{folder} to access papers in that topic.\n"
+        parts.extend(f"- {folder}\n" for folder in folders)
+        parts.append(f"\nUse @{folders[-1]} to access papers in that topic.\n")
     else:
-        content += "No topics found.\n"
+        parts.append("No topics found.\n")
     
-    return content
+    return "".join(parts)
 
 @mcp.resource("papers://{topic}")
 def get_topic_papers(topic: str) -> str:
@@ -204,30 +221,27 @@ def get_topic_papers(topic: str) -> str:
     Args:
         topic: The research topic to retrieve papers for
     """
-    topic_dir = topic.lower().replace(" ", "_")
+    topic_dir = topic_slug(topic)
     papers_file = os.path.join(PAPER_DIR, topic_dir, "papers_info.json")
     
-    if not os.path.exists(papers_file):
-        return f"# No papers found for topic: {topic}\n\nTry searching for papers on this topic first."
-    
     try:
-        with open(papers_file, 'r') as f:
-            papers_data = json.load(f)
-        
-        # Create markdown content with paper details
-        content = f"# Papers on {topic.replace('_', ' ').title()}\n\n"
-        content += f"Total papers: {len(papers_data)}\n\n"
-        
-        for paper_id, paper_info in papers_data.items():
-            content += f"## {paper_info['title']}\n"
-            content += f"- **Paper ID**: {paper_id}\n"
-            content += f"- **Authors**: {', '.join(paper_info['authors'])}\n"
-            content += f"- **Published**: {paper_info['published']}\n"
-            content += f"- **PDF URL**: [{paper_info['pdf_url']}]({paper_info['pdf_url']})\n\n"
-            content += f"### Summary\n{paper_info['summary'][:500]}...\n\n"
-            content += "---\n\n"
-        
-        return content
+        # Create markdown content with paper details; papers are streamed, so
+        # the total is filled in once they have all been rendered
+        parts = [f"# Papers on {topic.replace('_', ' ').title()}\n\n", None]
+        for paper_id, paper_info in iter_papers(papers_file):
+            parts.append(
+                f"## {paper_info['title']}\n"
+                f"- **Paper ID**: {paper_id}\n"
+                f"- **Authors**: {', '.join(paper_info['authors'])}\n"
+                f"- **Published**: {paper_info['published']}\n"
+                f"- **PDF URL**: [{paper_info['pdf_url']}]({paper_info['pdf_url']})\n\n"
+                f"### Summary\n{paper_info['summary'][:500]}...\n\n"
+                "---\n\n"
+            )
+        parts[1] = f"Total papers: {len(parts) - 2}\n\n"
+        return "".join(parts)
+    except FileNotFoundError:
+        return f"# No papers found for topic: {topic}\n\nTry searching for papers on this topic first."
     except json.JSONDecodeError:
         return f"# Error reading papers data for {topic}\n\nThe papers data file is corrupted."
 
@@ -264,7 +278,7 @@ def run_chatbot():
     
     # Initialize OpenAI client
     try:
-        openai_client = openai.OpenAI()
+        openai_client = openai.OpenAI(http_client=_HTTPX)
         print("✅ OpenAI client initialized")
     except Exception as e:
         print(f"❌ Error initializing OpenAI client: {str(e)}")
@@ -272,7 +286,7 @@ def run_chatbot():
         return
     
     # Define tools for OpenAI
-    tools = [
+    tools = (
         {
             "type": "function",
             "function": {
@@ -338,13 +352,28 @@ def run_chatbot():
                     }
                 }
             }
-        }
-    ]
+        },
+    )
+    
+    # Built once and shared by every request, so each turn only adds its messages
+    system_message = {
+        "role": "system",
+        "content": """You are a helpful research assistant that can search for and analyze research papers from arXiv. 
+                You have access to tools that can:
+                1. Search for papers on specific topics
+                2. Extract detailed information about papers
+                3. List available research topics
+                4. Get paper counts by topic
+                
+                Use these tools to help users find and understand research papers. Be conversational and helpful.
+                When you find papers, provide a summary of the key findings and suggest what might be interesting to explore further."""
+    }
+    create_kwargs = dict(model="gpt-4o-mini", tools=tools, max_tokens=1500)
     
     def call_tool(tool_name: str, arguments: dict):
         """Call a tool function"""
         if tool_name == "search_papers":
-            return search_papers(**arguments)
+            return _search_papers(**arguments)
         elif tool_name == "extract_info":
             return extract_info(**arguments)
         elif tool_name == "list_topics":
@@ -355,21 +384,75 @@ def run_chatbot():
         else:
             return f"Unknown tool: {tool_name}"
     
+    def run_tool(tool_call_id: str, tool_name: str, tool_args: dict) -> dict:
+        """Run one tool call and build its tool message"""
+        tool_result = call_tool(tool_name, tool_args)
+        
+        # Lists and dicts go to the model as JSON rather than Python reprs
+        if not isinstance(tool_result, str):
+            tool_result = orjson.dumps(tool_result, default=str).decode()
+        
+        return {
+            "role": "tool",
+            "tool_call_id": tool_call_id,
+            "content": tool_result
+        }
+    
+    def start_tool(tool_call: dict):
+        """Start one streamed tool call on the tool pool"""
+        tool_name = tool_call["function"]["name"]
+        tool_args = orjson.loads(tool_call["function"]["arguments"] or "{}")
+        
+        print(f"Calling tool: {tool_name} with args: {tool_args}")
+        
+        return _TOOL_POOL.submit(run_tool, tool_call["id"], tool_name, tool_args)
+    
+    def stream_completion(messages: list) -> tuple:
+        """
+        Stream one reply from GPT, starting each tool call as soon as it has
+        streamed completely; calls run alongside each other and the rest of
+        the reply.
+        
+        Returns the assistant text, the tool calls in OpenAI message format
+        and their tool messages.
+        """
+        stream = openai_client.chat.completions.create(
+            **create_kwargs, messages=messages, stream=True
+        )
+        content_parts = []
+        tool_calls = []
+        futures = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content_parts.append(delta.content)
+            for delta_call in delta.tool_calls or ():
+                if delta_call.index == len(tool_calls):
+                    # A new index means the previous call has streamed completely
+                    if tool_calls:
+                        futures.append(start_tool(tool_calls[-1]))
+                    tool_calls.append({
+                        "id": "", "type": "function", "function": {"name": "", "arguments": ""}
+                    })
+                tool_call = tool_calls[delta_call.index]
+                if delta_call.id:
+                    tool_call["id"] = delta_call.id
+                if delta_call.function:
+                    tool_call["function"]["name"] += delta_call.function.name or ""
+                    tool_call["function"]["arguments"] += delta_call.function.arguments or ""
+        if tool_calls:
+            futures.append(start_tool(tool_calls[-1]))
+        
+        # Results keep call order, as the API expects
+        tool_messages = [future.result() for future in futures]
+        return "".join(content_parts) or None, tool_calls, tool_messages
+    
     def chat_with_gpt(user_message: str):
         """Chat with GPT using the tools"""
         messages = [
-            {
-                "role": "system",
-                "content": """You are a helpful research assistant that can search for and analyze research papers from arXiv. 
-                You have access to tools that can:
-                1. Search for papers on specific topics
-                2. Extract detailed information about papers
-                3. List available research topics
-                4. Get paper counts by topic
-                
-                Use these tools to help users find and understand research papers. Be conversational and helpful.
-                When you find papers, provide a summary of the key findings and suggest what might be interesting to explore further."""
-            },
+            system_message,
             {
                 "role": "user",
                 "content": user_message
@@ -377,47 +460,18 @@ def run_chatbot():
         ]
         
         try:
-            # Get initial response from GPT
-            response = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                tools=tools,
-                max_tokens=1500
-            )
-            
-            assistant_message = response.choices[0].message
-            messages.append(assistant_message)
-            
-            # Handle tool calls if any
-            while assistant_message.tool_calls:
-                for tool_call in assistant_message.tool_calls:
-                    tool_name = tool_call.function.name
-                    tool_args = json.loads(tool_call.function.arguments)
-                    
-                    print(f"Calling tool: {tool_name} with args: {tool_args}")
-                    
-                    # Call the tool function
-                    tool_result = call_tool(tool_name, tool_args)
-                    
-                    # Add tool result to messages
-                    messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": str(tool_result)
-                    })
+            # Keep answering tool calls until GPT replies with plain text
+            while True:
+                content, tool_calls, tool_messages = stream_completion(messages)
+                if not tool_calls:
+                    return content
                 
-                # Get next response from GPT
-                response = openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages,
-                    tools=tools,
-                    max_tokens=1500
-                )
-                
-                assistant_message = response.choices[0].message
-                messages.append(assistant_message)
-            
-            return assistant_message.content
+                messages.append({
+                    "role": "assistant",
+                    "content": content,
+                    "tool_calls": tool_calls
+                })
+                messages.extend(tool_messages)
             
         except Exception as e:
             return f"Sorry, I encountered an error: {str(e)}"
@@ -0,0 +1,615 @@
+"""Shared MCP chatbot core used by mcp_chatbot.py and mcp_client.py."""
+
+from dotenv import load_dotenv
+import httpx
+import openai
+from mcp import ClientSession, StdioServerParameters, types
+from mcp.client.stdio import stdio_client
+from typing import List, Dict, Set, Tuple, TypedDict
+from contextlib import AsyncExitStack
+from functools import lru_cache
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import asyncio
+
+try:
+    import orjson
+
+    def json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    json_dumps_bytes = orjson.dumps
+    json_loads = orjson.loads
+except ImportError:  # orjson is optional; fall back to the stdlib
+    def json_dumps_bytes(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+    json_dumps = json.dumps
+    json_loads = json.loads
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; counts are approximated without it
+    tiktoken = None
+
+@lru_cache(maxsize=None)
+def _encoding():
+    # Loaded on the first count rather than at import: building the encoding
+    # is slow and may download its vocabulary
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning("Could not load the tiktoken encoding, approximating token counts: %s", e)
+        return None
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:  # approximate ~4 characters per token
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the history re-sent on each round-trip, and how many times
+# the same tool call may repeat back-to-back before the query is abandoned.
+MAX_HISTORY_TOKENS = 6000
+MAX_REPEATED_TOOL_CALLS = 3
+
+MODEL_NAME = "gpt-4o-mini"
+
+# Tools whose names start with these prefixes are treated as read-only, so
+# identical calls within one query can share a single result until a tool
+# that may change state runs. Servers can mark more tools as pure with a
+# "pureTools" list in server_config.json. "search_" is deliberately absent:
+# search_papers saves what it finds.
+PURE_TOOL_PREFIXES = ("get_", "list_", "read_", "extract_")
+
+# Idempotent tools whose results may be reused across sessions are listed with
+# a TTL in seconds under "cacheTtl" in their server's config, e.g.
+# "cacheTtl": {"fetch": 3600}. Tools without a TTL are never cached on disk.
+RESULTS_CACHE_PATH = os.path.expanduser("~/.cache/mcp_chatbot/results.sqlite3")
+
+# Keys in a server's config that configure this client rather than the process
+CLIENT_CONFIG_KEYS = {"pureTools", "cacheTtl"}
+
+def configure_logging() -> None:
+    """Send the chatbot's diagnostics to stderr at the MCP_LOG_LEVEL level.
+
+    Called by the entrypoints; stderr keeps the diagnostics from interleaving
+    with the chat on stdout. Per-tool-call lines are DEBUG and cost nothing
+    at the default INFO level, which is also used when MCP_LOG_LEVEL is not
+    a level name.
+    """
+    level = os.environ.get("MCP_LOG_LEVEL", "INFO").upper()
+    if not isinstance(logging.getLevelName(level), int):
+        level = "INFO"
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(level)
+
+def _load_server_config(path: str = "server_config.json") -> dict:
+    with open(path, "rb") as file:
+        return json_loads(file.read())
+
+class ToolResultCache:
+    """On-disk cache of formatted tool results, keyed by tool name and raw arguments.
+
+    Methods are thread-safe so they can run in worker threads off the event
+    loop; the database is opened on first use.
+    """
+
+    def __init__(self, path: str = RESULTS_CACHE_PATH):
+        self._path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            self._db = sqlite3.connect(self._path, check_same_thread=False)
+            with self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, expires REAL, content TEXT)"
+                )
+                # Expired rows are never read again, so drop them once per session
+                self._db.execute("DELETE FROM results WHERE expires < ?", (time.time(),))
+        return self._db
+
+    @staticmethod
+    def _key(tool_name: str, tool_args: str) -> str:
+        return hashlib.blake2b(f"{tool_name}|{tool_args}".encode()).hexdigest()
+
+    def get(self, tool_name: str, tool_args: str):
+        """Return the cached content, or None when missing or expired."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT content, expires FROM results WHERE key = ?", (self._key(tool_name, tool_args),)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, tool_name: str, tool_args: str, content: str, ttl: float) -> None:
+        with self._lock:
+            db = self._connect()
+            with db:
+                db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                    (self._key(tool_name, tool_args), time.time() + ttl, content)
+                )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+def _read_line(prompt: str) -> str:
+    """input() on the raw stdin descriptor.
+
+    sys.stdin's buffer is locked while a read waits, and a daemon thread
+    holding that lock aborts interpreter shutdown; the raw fd has no lock.
+    """
+    print(prompt, end="", flush=True)
+    line = bytearray()
+    while not line.endswith(b"\n"):
+        byte = os.read(sys.stdin.fileno(), 1)
+        if not byte:
+            if not line:
+                raise EOFError
+            break
+        line += byte
+    return line.decode(sys.stdin.encoding or "utf-8", "replace").rstrip("\r\n")
+
+async def _ainput(prompt: str) -> str:
+    """input() without blocking the event loop.
+
+    The read runs in a daemon thread rather than the default executor, whose
+    non-daemon threads would make asyncio.run wait for Enter after Ctrl-C.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def deliver(set_outcome, value):
+        if not future.done():
+            set_outcome(value)
+
+    def read():
+        try:
+            outcome = (future.set_result, _read_line(prompt))
+        except BaseException as e:
+            outcome = (future.set_exception, e)
+        try:
+            loop.call_soon_threadsafe(deliver, *outcome)
+        except RuntimeError:  # the loop has already closed
+            pass
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
+def _content_text(item):
+    """Text of an MCP text content item (a TextContent model or its dict form), else None."""
+    if isinstance(item, dict):
+        return item.get("text") if item.get("type") == "text" else None
+    return item.text if getattr(item, "type", None) == "text" else None
+
+class _QueryState:
+    """Tool-call bookkeeping shared by every completion of one query."""
+
+    def __init__(self):
+        # Results of pure tool calls, shared by identical calls for this query
+        self.call_cache: Dict[Tuple[str, str], asyncio.Task] = {}
+        # The previous call and how many times in a row it has been issued
+        self.last_call: Tuple[str, str] = None
+        self.repeats = 0
+        self.looping = False
+
+class ToolDefinition(TypedDict):
+    name: str
+    description: str
+    input_schema: dict
+
+class MCP_ChatBot:
+
+    def __init__(self, system_instruction: str = None):
+        # Initialize session and client objects
+        self.sessions: List[ClientSession] = [] # new
+        self.exit_stack = AsyncExitStack() # new
+        # One pooled HTTP/2 connection is reused across every completion in a query
+        self.http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60),
+            timeout=httpx.Timeout(60.0, connect=5.0)
+        )
+        self.openai_client = openai.AsyncOpenAI(http_client=self.http_client)
+        self.available_tools: List[ToolDefinition] = [] # new
+        self.tool_to_session: Dict[str, ClientSession] = {} # new
+        self.pure_tools: Set[str] = set()
+        self._server_config: dict = None
+        # Built once and reused as messages[0] of every query
+        self._system_msg = (
+            {'role': 'system', 'content': system_instruction} if system_instruction else None
+        )
+        self.cache_ttls: Dict[str, float] = {}
+        self._result_cache: ToolResultCache = None
+        # Cap concurrent tool calls and server start-ups so bursts don't
+        # overrun individual stdio pipes or open too many processes at once
+        self._tool_sem = asyncio.Semaphore(int(os.environ.get("MCP_MAX_INFLIGHT", "8")))
+        self._connect_sem = asyncio.Semaphore(4)
+        # Request arguments shared by every completion; tools is the live
+        # catalog list, so servers connected later are included
+        self._create_kwargs = dict(
+            model=MODEL_NAME, tools=self.available_tools, max_tokens=2024
+        )
+
+
+    async def connect_to_server(self, server_name: str, server_config: dict) -> None:
+        """Connect to a single MCP server."""
+        # The stdio transport must be closed by the task that opened it, so each
+        # connection is held open by its own task until cleanup releases it.
+        connected = asyncio.get_running_loop().create_future()
+        close = asyncio.Event()
+        task = asyncio.create_task(
+            self._hold_connection(server_name, server_config, connected, close)
+        )
+        self.exit_stack.push_async_callback(self._release_connection, task, close)
+        await connected
+
+    async def _release_connection(self, task: asyncio.Task, close: asyncio.Event) -> None:
+        close.set()
+        await task
+
+    async def _hold_connection(self, server_name: str, server_config: dict,
+                               connected: asyncio.Future, close: asyncio.Event) -> None:
+        try:
+            async with AsyncExitStack() as stack:
+                # Bound how many servers are spawned and initialized at once
+                async with self._connect_sem:
+                    server_params = StdioServerParameters(**{
+                        key: value for key, value in server_config.items()
+                        if key not in CLIENT_CONFIG_KEYS
+                    })
+                    stdio_transport = await stack.enter_async_context(
+                        stdio_client(server_params)
+                    )
+                    read, write = stdio_transport
+                    session = await stack.enter_async_context(
+                        ClientSession(read, write)
+                    )
+                    await session.initialize()
+                    self.sessions.append(session)
+                
+                    # List available tools for this session
+                    response = await session.list_tools()
+                    tools = response.tools
+                logger.info("Connected to %s with tools: %s", server_name, [tool.name for tool in tools])
+            
+                for tool in tools: # new
+                    self.tool_to_session[tool.name] = session
+                    # Tools cached across sessions are idempotent, so they are
+                    # pure within a query as well
+                    ttl = server_config.get("cacheTtl", {}).get(tool.name)
+                    if ttl:
+                        self.cache_ttls[tool.name] = ttl
+                    if (ttl or tool.name.startswith(PURE_TOOL_PREFIXES)
+                            or tool.name in server_config.get("pureTools", ())):
+                        self.pure_tools.add(tool.name)
+                    self.available_tools.append({
+                        "type": "function",
+                        "function": {
+                            "name": tool.name,
+                            "description": tool.description,
+                            "parameters": tool.inputSchema
+                        }
+                    })
+                connected.set_result(None)
+                await close.wait()
+        except Exception as e:
+            if connected.done():
+                logger.error("Error closing connection to %s: %s", server_name, e)
+            else:
+                logger.error("Failed to connect to %s: %s", server_name, e)
+        finally:
+            if not connected.done():
+                connected.set_result(None)
+
+    async def connect_to_servers(self): # new
+        """Connect to all configured MCP servers."""
+        try:
+            # Read the config off the event loop, once per chatbot
+            if self._server_config is None:
+                self._server_config = await asyncio.to_thread(_load_server_config)
+            data = self._server_config
+            
+            servers = data.get("mcpServers", {})
+            
+            # Servers are independent, so start them all at once
+            await asyncio.gather(
+                *(self.connect_to_server(name, config) for name, config in servers.items()),
+                return_exceptions=True
+            )
+        except Exception as e:
+            logger.error("Error loading server configuration: %s", e)
+            raise
+
+    def _format_tool_content(self, result) -> str:
+        """Convert MCP tool result content to a plain string for OpenAI tool messages."""
+        try:
+            content = getattr(result, "content", result)
+            if isinstance(content, list):
+                texts = [_content_text(item) for item in content]
+                # Fast path: all-text results (the common case) are joined directly
+                if None not in texts:
+                    return "\n".join(texts)
+                # Mixed content is assembled as UTF-8 in one buffer and decoded once
+                buf = bytearray()
+                for i, (item, text) in enumerate(zip(content, texts)):
+                    if i:
+                        buf += b"\n"
+                    if text is not None:
+                        buf += text.encode()
+                    elif hasattr(item, "model_dump"):
+                        buf += json_dumps_bytes(item.model_dump(mode="json"))
+                    elif isinstance(item, dict):
+                        buf += json_dumps_bytes(item)
+                    else:
+                        buf += str(item).encode()
+                return buf.decode()
+            if isinstance(content, (dict, list)):
+                return json_dumps(content)
+            return str(content)
+        except Exception:
+            return str(result)
+    
+    def _results(self) -> ToolResultCache:
+        # Created on first use so chatbots without cached tools never touch disk
+        if self._result_cache is None:
+            self._result_cache = ToolResultCache()
+        return self._result_cache
+
+    async def _invoke(self, tool_name: str, tool_args: str):
+        """Parse a single tool call's arguments and run it on its owning session.
+
+        Tools with a cache TTL return their formatted content, served from the
+        on-disk cache when a fresh entry exists. Arguments that are not a JSON
+        object produce an error message for the model instead of a call.
+        """
+        ttl = self.cache_ttls.get(tool_name)
+        if ttl:
+            # sqlite blocks on disk, so it runs in a worker thread
+            cached = await asyncio.to_thread(self._results().get, tool_name, tool_args)
+            if cached is not None:
+                logger.debug("Using cached result for %s with args %s", tool_name, tool_args)
+                return cached
+        
+        logger.debug("Calling tool %s with args %s", tool_name, tool_args)
+        
+        # Parse tool_args from JSON string to dictionary; arguments that can't
+        # be decoded go back to the model as an error instead of being dropped
+        try:
+            tool_args_dict = json_loads(tool_args) if tool_args else {}
+        except ValueError as e:
+            logger.warning("Error parsing arguments for tool %s: %s", tool_name, e)
+            return f"Error: invalid arguments for tool {tool_name}: {e}"
+        if not isinstance(tool_args_dict, dict):
+            logger.warning("Arguments for tool %s are not a JSON object", tool_name)
+            return f"Error: invalid arguments for tool {tool_name}: expected a JSON object"
+        
+        # Call a tool
+        session = self.tool_to_session[tool_name]
+        async with self._tool_sem:
+            result = await session.call_tool(tool_name, arguments=tool_args_dict)
+        
+        if ttl and not getattr(result, "isError", False):
+            content = self._format_tool_content(result)
+            await asyncio.to_thread(self._results().set, tool_name, tool_args, content, ttl)
+            return content
+        return result
+    
+    def _start_tool_call(self, tool_call: dict, tasks: Dict[int, asyncio.Task], index: int,
+                         state: _QueryState) -> None:
+        if index in tasks or state.looping:
+            return
+        function = tool_call["function"]
+        key = (function["name"], function["arguments"])
+        # Stop when the model keeps reissuing the identical call; the call
+        # that reaches the limit is never started
+        state.repeats = state.repeats + 1 if key == state.last_call else 1
+        state.last_call = key
+        if state.repeats >= MAX_REPEATED_TOOL_CALLS:
+            state.looping = True
+            return
+        # Repeated calls to a pure tool reuse the earlier call instead of
+        # going back to the server
+        call_cache = state.call_cache
+        if key in call_cache:
+            tasks[index] = call_cache[key]
+            return
+        tasks[index] = asyncio.create_task(self._invoke(*key))
+        if function["name"] in self.pure_tools:
+            call_cache[key] = tasks[index]
+        else:
+            # Any other tool may change what the pure ones would return
+            call_cache.clear()
+
+    async def _stream_completion(self, messages: list, state: _QueryState):
+        """Stream one completion, printing text as it arrives and starting each
+        tool call as soon as its arguments are complete.
+
+        Returns the assistant text, the tool calls in OpenAI message format and
+        the tasks running them, in call order. Calls past a detected loop are
+        not started, so they have no task.
+        """
+        stream = await self.openai_client.chat.completions.create(
+            **self._create_kwargs, messages=messages, stream=True
+        )
+        content_parts = []
+        tool_calls: Dict[int, dict] = {}
+        tasks: Dict[int, asyncio.Task] = {}
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    print(delta.content, end="", flush=True)
+                    content_parts.append(delta.content)
+                for delta_call in delta.tool_calls or ():
+                    index = delta_call.index
+                    # A new index means every earlier call has streamed completely
+                    for earlier in tool_calls:
+                        if earlier < index:
+                            self._start_tool_call(tool_calls[earlier], tasks, earlier, state)
+                    tool_call = tool_calls.setdefault(index, {
+                        "id": "", "type": "function", "function": {"name": "", "arguments": ""}
+                    })
+                    if delta_call.id:
+                        tool_call["id"] = delta_call.id
+                    delta_function = delta_call.function
+                    if delta_function:
+                        function = tool_call["function"]
+                        function["name"] += delta_function.name or ""
+                        function["arguments"] += delta_function.arguments or ""
+                        # Arguments are a JSON object, so once they parse they are complete
+                        if function["arguments"].endswith("}"):
+                            try:
+                                json_loads(function["arguments"])
+                            except ValueError:
+                                pass
+                            else:
+                                self._start_tool_call(tool_call, tasks, index, state)
+        except BaseException:
+            # Don't leave calls started from a broken stream running unowned
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        if content_parts:
+            print()
+        for index, tool_call in tool_calls.items():
+            self._start_tool_call(tool_call, tasks, index, state)
+        
+        order = sorted(tool_calls)
+        return ("".join(content_parts) or None,
+                [tool_calls[i] for i in order],
+                [tasks[i] for i in order if i in tasks])
+
+    def _message_tokens(self, message) -> int:
+        text = message.get("content") or ""
+        for tool_call in message.get("tool_calls") or ():
+            text += tool_call["function"]["name"] + tool_call["function"]["arguments"]
+        return count_tokens(text)
+
+    def _trim(self, messages: list, max_tokens: int = MAX_HISTORY_TOKENS) -> list:
+        """Keep the system and user messages plus as many recent turns as fit the budget."""
+        head_len = 2 if messages[0]["role"] == "system" else 1
+        head, rest = messages[:head_len], messages[head_len:]
+        
+        # Group the history into turns so tool results are never separated
+        # from the assistant message whose tool_calls they answer
+        turns = []
+        for message in rest:
+            if message["role"] == "tool" and turns:
+                turns[-1].append(message)
+            else:
+                turns.append([message])
+        
+        budget = max_tokens - sum(self._message_tokens(m) for m in head)
+        kept = []
+        for turn in reversed(turns):
+            budget -= sum(self._message_tokens(m) for m in turn)
+            # The latest turn is always kept, even when it alone exceeds the budget
+            if budget < 0 and kept:
+                break
+            kept.append(turn)
+        return head + [m for turn in reversed(kept) for m in turn]
+    
+    async def process_query(self, query, *, system_instruction: str = None):
+        """Answer one query, running tool calls until the model stops requesting them.
+
+        system_instruction overrides the chatbot's default system prompt, if any.
+        """
+        system_msg = self._system_msg
+        if system_instruction is not None:
+            system_msg = {'role': 'system', 'content': system_instruction}
+        messages = [{'role': 'user', 'content': query}]
+        if system_msg:
+            messages.insert(0, system_msg)
+        state = _QueryState()
+        process_query = True
+        while process_query:
+            assistant_content, tool_calls, tasks = await self._stream_completion(
+                self._trim(messages), state
+            )
+            
+            if not tool_calls:
+                messages.append({'role': 'assistant', 'content': assistant_content})
+                process_query = False
+                continue
+            
+            messages.append({'role': 'assistant', 'content': assistant_content, 'tool_calls': tool_calls})
+            
+            if state.looping:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                print(f"Error: a tool was called {MAX_REPEATED_TOOL_CALLS} times in a row "
+                      f"with the same arguments; stopping.")
+                return
+            
+            # Tool calls were started while the response streamed and run
+            # concurrently; results are collected in call order so
+            # tool_call_id ordering is preserved.
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            append, format_content = messages.append, self._format_tool_content
+            for tool_call, result in zip(tool_calls, results):
+                if isinstance(result, BaseException):
+                    content = f"Error calling tool {tool_call['function']['name']}: {result}"
+                else:
+                    content = format_content(result)
+                append({
+                    "role": "tool",
+                    "tool_call_id": tool_call["id"],
+                    "content": content
+                })
+
+    
+    
+    async def chat_loop(self):
+        """Run an interactive chat loop"""
+        print("\nMCP Chatbot Started!")
+        print("Type your queries or 'quit' to exit.")
+        
+        while True:
+            try:
+                # Read input off the event loop so MCP sessions keep being serviced
+                query = (await _ainput("\nQuery: ")).strip()
+        
+                if query.lower() == 'quit':
+                    break
+                    
+                await self.process_query(query)
+                print("\n")
+                    
+            except Exception as e:
+                print(f"\nError: {str(e)}")
+    
+    async def cleanup(self): # new
+        """Cleanly close all resources using AsyncExitStack."""
+        await self.exit_stack.aclose()
+        await self.http_client.aclose()
+        if self._result_cache is not None:
+            await asyncio.to_thread(self._result_cache.close)
+
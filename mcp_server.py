@@ -1,11 +1,14 @@
 # %%writefile mcp_project/mcp_server.py
 
 import arxiv
+import asyncio
 import json
 import os
 import logging
 from typing import List, Dict, Any
 from mcp.server.fastmcp import FastMCP
+from arxiv_client import fetch_results
+from papers_store import read_papers_info, write_papers_info, format_paper_info, find_paper, topic_slug
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,7 +18,7 @@ PAPER_DIR = "papers"
 mcp = FastMCP("research-papers") # Initialize MCP Server
 
 @mcp.tool()
-def search_papers(topic: str, max_results: int = 5) -> List[str]:
+async def search_papers(topic: str, max_results: int = 5) -> List[str]:
     """
     Search for papers on arXiv based on a topic and store their information.
     
@@ -30,8 +33,6 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         logger.info(f"Searching for papers on topic: {topic}")
         
          
-        client = arxiv.Client()     # Use arxiv to find the papers
-
         # Search for the most relevant articles matching the queried topic
         search = arxiv.Search(
             query = topic,
@@ -39,20 +40,20 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
             sort_by = arxiv.SortCriterion.Relevance
         )
 
-        papers = list(client.results(search))
+        # The arxiv client blocks on HTTP, so fetch in a worker thread
+        papers = await asyncio.to_thread(fetch_results, search)
         
         if not papers:
             logger.warning(f"No papers found for topic: {topic}")
             return []
         
-        path = os.path.join(PAPER_DIR, topic.lower().replace(" ", "_"))
+        path = os.path.join(PAPER_DIR, topic_slug(topic))
         os.makedirs(path, exist_ok=True)
         
         file_path = os.path.join(path, "papers_info.json")
 
         try:
-            with open(file_path, "r") as json_file:
-                papers_info = json.load(json_file)
+            papers_info = dict(read_papers_info(file_path))  # copy: the parsed dict is shared
         except (FileNotFoundError, json.JSONDecodeError):
             papers_info = {}
 
@@ -71,8 +72,7 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
             papers_info[paper_id] = paper_info
         
         # Save updated papers_info to json file
-        with open(file_path, "w") as json_file:
-            json.dump(papers_info, json_file, indent=2)
+        write_papers_info(file_path, papers_info)
         
         logger.info(f"Found {len(paper_ids)} papers for topic '{topic}'. Results saved in: {file_path}")
         return paper_ids
@@ -95,23 +95,15 @@ def extract_info(paper_id: str) -> str:
     try:
         logger.info(f"Extracting info for paper ID: {paper_id}")
         
-        if not os.path.exists(PAPER_DIR):
+        try:
+            found = find_paper(PAPER_DIR, paper_id)
+        except FileNotFoundError:
             return f"Papers directory '{PAPER_DIR}' does not exist."
- 
-        for item in os.listdir(PAPER_DIR):
-            item_path = os.path.join(PAPER_DIR, item)
-            if os.path.isdir(item_path):
-                file_path = os.path.join(item_path, "papers_info.json")
-                if os.path.isfile(file_path):
-                    try:
-                        with open(file_path, "r") as json_file:
-                            papers_info = json.load(json_file)
-                            if paper_id in papers_info:
-                                logger.info(f"Found paper {paper_id} in topic directory: {item}")
-                                return json.dumps(papers_info[paper_id], indent=2)
-                    except (FileNotFoundError, json.JSONDecodeError) as e:
-                        logger.warning(f"Error reading {file_path}: {str(e)}")
-                        continue
+        
+        if found is not None:
+            topic_dir, paper_info = found
+            logger.info(f"Found paper {paper_id} in topic directory: {topic_dir}")
+            return format_paper_info(paper_info)
         
         logger.warning(f"Paper {paper_id} not found in any topic directory")
         return f"There's no saved information related to paper {paper_id}."
@@ -0,0 +1,272 @@
+"""Reading and writing the papers_info.json files shared by the research tools."""
+
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import Dict, Iterator, Optional, Tuple
+
+import orjson
+
+try:
+    import ijson
+except ImportError:  # ijson is optional; without it files are parsed whole
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+PAPERS_FILE = "papers_info.json"
+
+# O_BINARY keeps Windows from translating line endings on raw reads
+_OPEN_FLAGS = os.O_RDONLY | getattr(os, "O_CLOEXEC", 0) | getattr(os, "O_BINARY", 0)
+
+# Parsed papers_info.json files, keyed by path and validated against the
+# file's mtime and size so repeated tool calls skip the read and parse
+_PARSED_CACHE: dict = {}
+
+# paper_id -> papers file holding it, per papers directory, with the
+# signature of the files it was built from. Built on the first lookup, kept
+# current by write_papers_info and rebuilt on a miss only when the signature
+# shows another process changed the topics, so paper lookups no longer walk
+# and parse every topic.
+_PAPER_INDEX: Dict[str, Tuple[tuple, Dict[str, str]]] = {}
+
+# (mtime_ns, size) of papers files that failed to parse, so each corrupted
+# version is only warned about once
+_BAD_FILES: Dict[str, Tuple[int, int]] = {}
+
+# Topic folder names and their display names per papers directory, keyed by
+# the directory's mtime, which changes whenever a topic folder is added,
+# removed or renamed
+_TOPIC_DIRS: Dict[str, Tuple[int, Tuple[str, ...], Dict[str, str]]] = {}
+
+# Files at least this large are streamed with ijson, when installed, instead
+# of being parsed whole and cached; smaller ones parse quickly and are worth
+# keeping parsed for the next call
+STREAM_THRESHOLD = 8 * 1024 * 1024
+
+# Paper counts of files that were streamed rather than cached, validated the
+# same way as _PARSED_CACHE, so counting a topic again only costs a stat
+_COUNT_CACHE: Dict[str, Tuple[int, int, int]] = {}
+
+
+def read_papers_info(file_path: str) -> dict:
+    """
+    Parse a topic's papers_info.json file.
+    
+    The parsed dict is cached and shared between callers until the file
+    changes, so callers must not modify it unless they write it back with
+    write_papers_info.
+    
+    Raises FileNotFoundError if the file is missing and json.JSONDecodeError
+    (orjson's error subclasses it) if it is corrupted.
+    """
+    # One open, one fstat and (when stale) one read; the fstat both validates
+    # the cache and sizes the read
+    fd = os.open(file_path, _OPEN_FLAGS)
+    try:
+        st = os.fstat(fd)
+        key = (st.st_mtime_ns, st.st_size)
+        cached = _PARSED_CACHE.get(file_path)
+        if cached is not None and cached[:2] == key:
+            return cached[2]
+        papers_info = orjson.loads(_slurp(fd, st.st_size))
+    finally:
+        os.close(fd)
+    _PARSED_CACHE[file_path] = (*key, papers_info)
+    return papers_info
+
+
+def _slurp(fd: int, size: int) -> bytes:
+    buf = os.read(fd, size)
+    while len(buf) < size:  # short read
+        chunk = os.read(fd, size - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return buf
+
+
+def _cached(file_path: str) -> Tuple[Tuple[int, int], Optional[dict]]:
+    st = os.stat(file_path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _PARSED_CACHE.get(file_path)
+    if cached is not None and cached[:2] == key:
+        return key, cached[2]
+    return key, None
+
+
+def _stream_papers(file_path: str) -> Iterator[Tuple[str, dict]]:
+    try:
+        with open(file_path, "rb") as json_file:
+            yield from ijson.kvitems(json_file, "", use_float=True)
+    except ijson.JSONError as e:
+        raise json.JSONDecodeError(str(e), "", 0) from e
+
+
+def iter_papers(file_path: str) -> Iterator[Tuple[str, dict]]:
+    """
+    Yield (paper_id, paper_info) pairs from a topic's papers_info.json file.
+    
+    Uses the parsed cache when it is current. Otherwise files of at least
+    STREAM_THRESHOLD bytes are streamed one paper at a time, with ijson
+    installed, and smaller ones are parsed and cached by read_papers_info.
+    Raises the same errors as read_papers_info.
+    """
+    key, papers_info = _cached(file_path)
+    if papers_info is None and ijson is not None and key[1] >= STREAM_THRESHOLD:
+        return _stream_papers(file_path)
+    if papers_info is None:
+        papers_info = read_papers_info(file_path)
+    return iter(papers_info.items())
+
+
+def count_papers(file_path: str) -> int:
+    """
+    Count the papers in a topic's papers_info.json file.
+    
+    Files that iter_papers would stream are counted without keeping them.
+    """
+    key, papers_info = _cached(file_path)
+    if papers_info is None and ijson is not None and key[1] >= STREAM_THRESHOLD:
+        cached = _COUNT_CACHE.get(file_path)
+        if cached is not None and cached[:2] == key:
+            return cached[2]
+        count = sum(1 for _ in _stream_papers(file_path))
+        _COUNT_CACHE[file_path] = (*key, count)
+        return count
+    if papers_info is None:
+        papers_info = read_papers_info(file_path)
+    return len(papers_info)
+
+
+def write_papers_info(file_path: str, papers_info: dict) -> None:
+    """
+    Write a topic's papers_info.json file and refresh its cache entry.
+    
+    The file is written to a temporary sibling and moved into place, so
+    readers never see a partially written file. The JSON is compact; tools
+    that show papers to people format them on the way out.
+    """
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as json_file:
+        json_file.write(orjson.dumps(papers_info, option=orjson.OPT_APPEND_NEWLINE))
+    os.replace(tmp_path, file_path)
+    st = os.stat(file_path)
+    _PARSED_CACHE[file_path] = (st.st_mtime_ns, st.st_size, papers_info)
+    
+    entry = _PAPER_INDEX.get(os.path.normpath(os.path.dirname(os.path.dirname(file_path))))
+    if entry is not None:
+        index = entry[1]
+        for paper_id in papers_info:
+            index[paper_id] = file_path
+
+
+@lru_cache(maxsize=512)
+def topic_slug(topic: str) -> str:
+    """Name of the folder holding a topic's papers."""
+    return topic.lower().replace(" ", "_")
+
+
+def _scan_topics(paper_dir: str) -> Tuple[int, Tuple[str, ...], Dict[str, str]]:
+    key = os.path.normpath(paper_dir)
+    mtime = os.stat(paper_dir).st_mtime_ns
+    cached = _TOPIC_DIRS.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached
+    
+    with os.scandir(paper_dir) as entries:
+        names = tuple(entry.name for entry in entries if entry.is_dir())
+    cached = _TOPIC_DIRS[key] = (mtime, names, {name: name.replace("_", " ") for name in names})
+    return cached
+
+
+def topic_dirs(paper_dir: str) -> Tuple[str, ...]:
+    """
+    List the topic folder names in a papers directory.
+    
+    The listing is only rescanned when the directory's mtime changes.
+    Raises FileNotFoundError if paper_dir does not exist.
+    """
+    return _scan_topics(paper_dir)[1]
+
+
+def topic_names(paper_dir: str) -> Dict[str, str]:
+    """
+    Map each topic folder in topic_dirs(paper_dir) to its display name.
+    
+    The dict is cached like the listing, so callers must not modify it.
+    """
+    return _scan_topics(paper_dir)[2]
+
+
+def _index_signature(paper_dir: str) -> tuple:
+    # The directory's mtime covers added and removed topics; each papers
+    # file's mtime and size cover papers saved to an existing topic
+    mtime, names, _ = _scan_topics(paper_dir)
+    files = []
+    for name in names:
+        file_path = os.path.join(paper_dir, name, PAPERS_FILE)
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            continue
+        files.append((file_path, st.st_mtime_ns, st.st_size))
+    return mtime, tuple(files)
+
+
+def _build_index(paper_dir: str, signature: tuple) -> Dict[str, str]:
+    index = {}
+    for file_path, *file_key in signature[1]:
+        try:
+            papers_info = read_papers_info(file_path)
+        except FileNotFoundError:
+            continue
+        except json.JSONDecodeError as e:
+            if _BAD_FILES.get(file_path) != tuple(file_key):
+                _BAD_FILES[file_path] = tuple(file_key)
+                logger.warning(f"Error reading {file_path}: {str(e)}")
+            continue
+        _BAD_FILES.pop(file_path, None)
+        for paper_id in papers_info:
+            index.setdefault(paper_id, file_path)
+    _PAPER_INDEX[os.path.normpath(paper_dir)] = (signature, index)
+    return index
+
+
+def _lookup(index: Dict[str, str], paper_id: str) -> Optional[Tuple[str, dict]]:
+    file_path = index.get(paper_id)
+    if file_path is None:
+        return None
+    try:
+        papers_info = read_papers_info(file_path)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if paper_id not in papers_info:
+        return None
+    return os.path.basename(os.path.dirname(file_path)), papers_info[paper_id]
+
+
+def find_paper(paper_dir: str, paper_id: str) -> Optional[Tuple[str, dict]]:
+    """
+    Look up a paper across all topic directories.
+    
+    Returns the topic directory name and the paper's information, or None if
+    no topic has it. Raises FileNotFoundError if paper_dir does not exist.
+    """
+    entry = _PAPER_INDEX.get(os.path.normpath(paper_dir))
+    if entry is not None:
+        found = _lookup(entry[1], paper_id)
+        if found is not None:
+            return found
+    # A miss may mean another process saved new papers, so rebuild, but only
+    # when a topic or papers file has changed since the index was built
+    signature = _index_signature(paper_dir)
+    if entry is not None and entry[0] == signature:
+        return None
+    return _lookup(_build_index(paper_dir, signature), paper_id)
+
+
+def format_paper_info(paper_info: dict) -> str:
+    """Render one paper's information as an indented JSON string."""
+    return orjson.dumps(paper_info, option=orjson.OPT_INDENT_2).decode()
\ No newline at end of file